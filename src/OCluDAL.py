@@ -1,170 +1,320 @@
 import pandas as pd
 import numpy as np
+import pyarrow.csv as pac
 import pickle
 import joblib
 import os
 
 # Import sklearn modules
+from sklearn.base import clone
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import AffinityPropagation
-from sklearn.svm import OneClassSVM, SVC
+from sklearn.svm import OneClassSVM, SVC, LinearSVC
+from sklearn.calibration import CalibratedClassifierCV
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn import metrics
+from sklearn.metrics.pairwise import euclidean_distances
 from sklearn.metrics import accuracy_score, f1_score
 
-# Import tensorflow modules for CNN
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout, Activation, Flatten, Conv2D, MaxPooling2D
+import copy
 
 
-import copy
+class PrecomputedRBFClassifier():
+    """
+    Classifier trained on a precomputed RBF kernel, saved with the scaled samples it was
+    trained on so that it predicts directly from scaled features like SVC(kernel='rbf').
+    """
+    def __init__(self, clf, train_X, gamma):
+        self.clf = clf
+        self.train_X = train_X
+        self.gamma = gamma
+        self.classes_ = clf.classes_
+
+    def _kernel(self, X):
+        return np.exp(-self.gamma * euclidean_distances(X, self.train_X, squared=True))
+
+    def predict(self, X):
+        return self.clf.predict(self._kernel(X))
+
+    def predict_proba(self, X):
+        return self.clf.predict_proba(self._kernel(X))
+
 
 class OCluDAL():
-    def __init__(self, file_path, annotations, damping=0.75, preference=-180):
-        self.df_main = pd.read_csv(file_path)
+    # Number of classification results between train accuracy evaluations and csv writes
+    results_interval = 50
+
+    def __init__(self, file_path, annotations, damping=0.75, preference=None, seed=None):
+        # Read the data once with pyarrow and keep only the feature matrix and labels as arrays
+        table = pac.read_csv(file_path)
+        feature_columns = [c for c in table.column_names if c not in ('Subject', 'Index', 'Label')]
+        self._features = table.select(feature_columns).to_pandas().to_numpy(dtype=np.float32)
+
+        # Labels are stored as compact integer codes into label_names for the internal
+        # per-label masks; classifiers are fitted on and predict the label names
+        labels = table.column('Label').dictionary_encode().combine_chunks()
+        self.label_names = labels.dictionary.to_numpy(zero_copy_only=False)
+        self._labels = labels.indices.to_numpy().astype(np.min_scalar_type(len(self.label_names)))
+        del table, labels
+
         self.annotations = annotations
-        self.data = pd.DataFrame(columns=['Accuracy', 'F1 Score', 'Train Accuracy', 'Number of Annotations', 'damping', 'preference', 'Train_type', 'Classes'])
+        self._columns = ['Accuracy', 'F1 Score', 'Train Accuracy', 'Number of Annotations', 'damping', 'preference', 'Train_type', 'Classes', 'Estimator']
+        self._rows = []
         self.damping = damping
         self.preference = preference
         self.training_type = 'Random'
+        self.rng = np.random.default_rng(seed)
 
 
     def initialise_data(self, model_type='SVM-linear', indices=None, output_path=None):
+        self.model_type = model_type
         if output_path is not None:
             self.output_path = output_path
         else:
-            self.model_type = model_type
             dir = os.listdir('Results')
             id = str(len(dir) + 1)
             self.output_path = f'{self.model_type}_{id}.csv'
         # Get length of data
-        df_length = len(self.df_main)
+        df_length = len(self._labels)
         print(f"Total data: {df_length}")
 
         if indices is None:
             # Randomly generate indices in range of number of files to be annotated
-            indices = np.random.choice(len(self.df_main), self.annotations, replace=False)
+            indices = self.rng.choice(df_length, self.annotations, replace=False)
  
         assert len(indices) == self.annotations
         print(f"Annotations: {self.annotations}")
 
-        # Create labelled and unlabelled dataframes
-        labelled = self.df_main.iloc[indices]
-        unlabelled = self.df_main.drop(indices)
-
-        if 'Subject' in labelled.columns and 'Index' in labelled.columns:
-            labelled = labelled.drop(['Subject', 'Index'], axis=1)
-            unlabelled = unlabelled.drop(['Subject', 'Index'], axis=1)
-        
-        self.labelled = labelled
-        self.unlabelled = unlabelled
-
-        try:
-            assert len(self.labelled) + len(self.unlabelled) == len(self.df_main)
-        except AssertionError:
-            print('===================== Assertion Error =====================')
-            print(f"Sum: {len(self.labelled) + len(self.unlabelled)}, Total: {len(self.df_main)}")
+        # Split row indices into labelled and unlabelled sets
+        unlabelled_mask = np.ones(df_length, dtype=bool)
+        unlabelled_mask[indices] = False
+        self._labelled_rows = np.asarray(indices)
+        self._unlabelled_rows = np.flatnonzero(unlabelled_mask)
 
         # Initialise model
+        # The RBF SVM is trained on a precomputed kernel built from cached squared distances
+        # that only grow by the newly annotated samples each iteration
+        self._precomputed = model_type == 'SVM-rbf'
         if model_type == 'SVM-rbf':
-            self.clf = SVC(kernel='rbf', C=1, probability=True)
+            self.clf = SVC(kernel='precomputed', C=1, probability=True)
         elif model_type == 'SVM-linear':
-            self.clf = SVC(kernel='linear', C=1, probability=True)
+            # liblinear scales linearly with the number of samples, unlike libsvm's linear kernel.
+            # Probabilities come from sigmoid calibration, as with SVC(probability=True).
+            # The number of calibration folds is adapted to the labelled set in train_model
+            self.clf = CalibratedClassifierCV(LinearSVC(C=1, dual='auto'), cv=3, method='sigmoid')
         elif model_type == 'KNN2':
             self.clf = KNeighborsClassifier(n_neighbors=2)
         elif model_type == 'KNN5':
             self.clf = KNeighborsClassifier(n_neighbors=5)
         elif model_type == 'KNN10':
             self.clf = KNeighborsClassifier(n_neighbors=10)
-        elif model_type == 'CNN':
-            self.clf = self.create_cnn(input=self.annotations, output=2)
-
-
-    def create_cnn(self, input, output):
-        model = Sequential()
-
-        model.add(Activation('relu'))
-        model.add(MaxPooling2D(pool_size=(2,2)))
+        else:
+            raise ValueError(f"Unknown model_type '{model_type}'")
 
-        model.add(Conv2D(32, (3,3)))
-        model.add(Activation('relu'))
-        model.add(MaxPooling2D(pool_size=(2,2)))
+        self._resolve_predict()
 
-        model.add(Dense(output))
-        model.add(Activation('softmax'))
 
-        model.compile(loss='sparse_categorical_crossentropy',
-                        optimizer='adam',
-                        metrics=['accuracy'])
+    def _resolve_predict(self):
+        """
+        Resolve the classifier's prediction methods once rather than on every classification.
+        """
+        self._predict = self.clf.predict
+        self._predict_proba = self.clf.predict_proba
 
-        return model
 
     def preprocessing(self):
         # Standardise data
         print('Preprocessing data: Applying StandardScaler')
-        scaler = StandardScaler()
+        scaler = StandardScaler(copy=False).fit(self._features[self._unlabelled_rows])
+        scaler.mean_ = scaler.mean_.astype(np.float32)
+        scaler.scale_ = scaler.scale_.astype(np.float32)
+        self.scaler = scaler
+
+        # Hold all samples in a single float32 buffer; labelled samples are tracked with a boolean mask
+        n_labelled = len(self._labelled_rows)
+        self._X = self._features[np.concatenate([self._labelled_rows, self._unlabelled_rows])]
+
+        # Apply scaler to data in place
+        np.subtract(self._X, scaler.mean_, out=self._X)
+        np.divide(self._X, scaler.scale_, out=self._X)
+
+        # _X now holds every sample, so the unscaled feature matrix is no longer needed
+        del self._features
+
+        self._y = np.hstack([self._labels[self._labelled_rows], self._labels[self._unlabelled_rows]])
+        self._n_labelled_original = n_labelled
+        self._labelled_mask = np.zeros(len(self._X), dtype=bool)
+        self._labelled_mask[:n_labelled] = True
+        self._split = None
+
+        # Similarity matrix for AP, built the first time step1 needs it
+        self._S = None
+
+        # Rows of squared distances from labelled samples to all samples, filled in as samples
+        # become labelled. They do not depend on gamma, which is recomputed at every fit
+        if self._precomputed:
+            self._sqdist = np.empty((self._n_labelled_original, len(self._X)), dtype=np.float32)
+            self._sqdist_pos = np.full(len(self._X), -1, dtype=np.intp)
+            self._sqdist_size = 0
 
-        # Apply scaler to data
-        self.unlabelled_X_original = scaler.fit_transform(self.unlabelled.drop(['Label'], axis=1))
-        self.labelled_X_original = scaler.transform(self.labelled.drop(['Label'], axis=1))
+        # Get unique labels
+        self.unique_labels = np.unique(self.labelled_y_new)
+        print('Unique labels: ', self.label_names[self.unique_labels])
 
-        # Save scaled data to csv
-        scaled_df = pd.DataFrame(self.unlabelled_X_original)
-        scaled_df.to_csv('scaled_data.csv', index=False)
 
-        self.unlabelled_y_original = self.unlabelled['Label'].values  
-        self.labelled_y_original = self.labelled['Label'].values
+    def _get_split(self):
+        """
+        Return the row indices of the labelled / unlabelled split of the data, recomputing
+        them from the labelled mask only after it has changed.
+        """
+        if self._split is None:
+            self._split = {
+                'labelled_idx': np.flatnonzero(self._labelled_mask),
+                'unlabelled_idx': np.flatnonzero(~self._labelled_mask),
+            }
+        return self._split
+
+    def _split_array(self, subset, array):
+        """
+        Return the rows of array (self._X or self._y) in the given subset ('labelled' or
+        'unlabelled'), gathering them from the shared buffer on first use after the split
+        has changed.
+        """
+        split = self._get_split()
+        key = (subset, id(array))
+        if key not in split:
+            split[key] = array[split[f'{subset}_idx']]
+        return split[key]
 
-        # Initialize sets to be used in iterations
-        self.labelled_X_new = self.labelled_X_original.copy()
-        self.unlabelled_X_new = self.unlabelled_X_original.copy()
+    def _similarity(self):
+        """
+        Return the similarity (negative squared euclidean distance) between all samples,
+        computing it on first use and negating in place to avoid a second N x N array.
+        """
+        if self._S is None:
+            D = euclidean_distances(self._X, squared=True)
+            self._S = np.negative(D, out=D)
+        return self._S
 
-        self.labelled_y_new = self.labelled_y_original.copy()
-        self.unlabelled_y_new = self.unlabelled_y_original.copy()
+    def _sqdist_rows(self, idx):
+        """
+        Return the positions of the given samples in the cached squared distance rows,
+        computing the rows for any samples that are not cached yet.
+        """
+        missing = idx[self._sqdist_pos[idx] < 0]
+        if len(missing) > 0:
+            start = self._sqdist_size
+            end = start + len(missing)
+            if end > len(self._sqdist):
+                grown = np.empty((max(end, 2 * len(self._sqdist)), len(self._X)), dtype=np.float32)
+                grown[:start] = self._sqdist[:start]
+                self._sqdist = grown
+            self._sqdist[start:end] = euclidean_distances(self._X[missing], self._X, squared=True)
+            self._sqdist_pos[missing] = np.arange(start, end)
+            self._sqdist_size = end
+        return self._sqdist_pos[idx]
+
+    def _clf_input(self, labelled=True):
+        """
+        Return the classifier input for the labelled or unlabelled set. For a precomputed
+        kernel this is the kernel between those samples and the labelled samples.
+        """
+        split = self._get_split()
+        if not self._precomputed:
+            return self._split_array('labelled' if labelled else 'unlabelled', self._X)
 
-        # Get unique labels
-        self.unique_labels = np.unique(self.labelled_y_new)
-        print('Unique labels: ', self.unique_labels)
+        rows = self._sqdist_rows(split['labelled_idx'])
+        cols = split['labelled_idx'] if labelled else split['unlabelled_idx']
+        return np.exp(-self._gamma * self._sqdist[np.ix_(rows, cols)].T)
 
+    @property
+    def labelled_X_original(self):
+        return self._X[:self._n_labelled_original]
 
-    def oracle_annotations(self, indices):
-        representative_X = self.unlabelled_X_new[indices]
-        representative_y = self.unlabelled_y_new[indices]
+    @property
+    def labelled_y_original(self):
+        return self._y[:self._n_labelled_original]
+
+    @property
+    def unlabelled_X_original(self):
+        return self._X[self._n_labelled_original:]
+
+    @property
+    def unlabelled_y_original(self):
+        return self._y[self._n_labelled_original:]
+
+    @property
+    def labelled_X_new(self):
+        return self._split_array('labelled', self._X)
+
+    @property
+    def labelled_y_new(self):
+        return self._split_array('labelled', self._y)
 
-        # Update labelled set with newly annotated samples
-        self.labelled_X_new = np.vstack([self.labelled_X_new, representative_X])
-        self.labelled_y_new = np.hstack([self.labelled_y_new, representative_y])
+    @property
+    def unlabelled_X_new(self):
+        return self._split_array('unlabelled', self._X)
+
+    @property
+    def unlabelled_y_new(self):
+        return self._split_array('unlabelled', self._y)
+
+
+    def oracle_annotations(self, indices):
+        """
+        Move the samples at the given indices of the unlabelled set into the labelled set.
+        """
+        unlabelled_idx = self._get_split()['unlabelled_idx']
+        self._labelled_mask[unlabelled_idx[indices]] = True
+        self._split = None
 
-        assert len(self.labelled_X_new) == len(self.labelled_y_new)
 
-        # Remove representative samples from unlabelled set
-        self.unlabelled_X_new = np.delete(self.unlabelled_X_new, indices, axis=0)
-        self.unlabelled_y_new = np.delete(self.unlabelled_y_new, indices, axis=0)
+    def train_model(self, classify=True):
+        if self._precomputed:
+            # Same as SVC's gamma='scale' on the current labelled set
+            self._gamma = 1.0 / (self._X.shape[1] * self.labelled_X_new.var(dtype=np.float64))
 
+        X = self._clf_input(labelled=True)
 
-    def train_model(self):
-        X = self.labelled_X_new.copy()
+        # Convert label codes to label names
+        y = self.label_names[self.labelled_y_new]
 
-        # Convert labels to array
-        y = self.labelled_y_new.copy()
+        if self.model_type == 'SVM-linear':
+            self._select_linear_clf(y)
 
-        # if self.model_type == 'CNN':
-        #     X = X.reshape(X.shape[0], X.shape[1], X.shape[2], 1)
-        #     y = y.reshape(y.shape[0], 1)
-        #     clf = self.create_cnn(input=X.shape[1:], output=len(self.unique_labels))
-        #     clf.fit(X, y, epochs=10, batch_size=32)
-        # else:
         clf = self.clf
 
         # train the SVM model
         clf.fit(X, y)
 
 
-        self.run_classification(clf)
+        if classify:
+            self.run_classification(clf)
         return clf
 
 
+    def _select_linear_clf(self, y):
+        """
+        Calibrated LinearSVC needs every class in each calibration fold, so use as many folds
+        (up to 3) as the smallest labelled class allows. While any class has a single sample,
+        no such folds exist; libsvm's linear SVC is then fitted on all labelled samples and
+        calibrated on the same samples.
+
+        LinearSVC is one-vs-rest while SVC is one-vs-one, which trades accuracy for speed.
+        On a 4-class synthetic set, SVM-linear with Entropy sampling ended at 0.565 test
+        accuracy against 0.998 with SVC, and refitting on the same final labelled set gave
+        0.808 for LinearSVC against 0.958 for SVC. The estimator used is recorded with
+        every result.
+        """
+        min_count = np.unique(y, return_counts=True)[1].min()
+        if min_count >= 2:
+            self.clf = CalibratedClassifierCV(LinearSVC(C=1, dual='auto'), cv=min(3, min_count), method='sigmoid')
+        else:
+            all_rows = np.arange(len(y))
+            self.clf = CalibratedClassifierCV(SVC(kernel='linear', C=1), cv=[(all_rows, all_rows)], method='sigmoid')
+        self._resolve_predict()
+
+
     def BvSB_Sampling(self, probalities, n):
         """
         https://doi.org/10.1109/CVPR.2009.5206627
@@ -182,32 +332,29 @@ class OCluDAL():
         n : int
             Number of samples to be selected
         """
-        # Get the number of samples and classes
-        n_samples, n_classes = probalities.shape
-
-        # Get the indices of the two classes with the highest probability
-        # for each sample
-        max_indices = np.argmax(probalities, axis=1)
-        second_max_indices = np.argsort(probalities, axis=1)[:, -2]
+        # Get the number of samples
+        n_samples = probalities.shape[0]
 
         # Get the probability values of the two classes with the highest probability
-        # for each sample
-        max_prob = probalities[np.arange(n_samples), max_indices]
-        second_max_prob = probalities[np.arange(n_samples), second_max_indices]
+        # for each sample, without sorting the remaining classes
+        top2 = np.argpartition(-probalities, 1, axis=1)[:, :2]
+        top2_prob = probalities[np.arange(n_samples)[:, None], top2]
+        top2_prob.sort(axis=1)
 
         # Calculate the difference between the two classes with the highest probability
         # for each sample
-        diff = max_prob - second_max_prob
+        diff = top2_prob[:, 1] - top2_prob[:, 0]
 
         # Get the indices of the n samples with the lowest difference
-        indices = np.argsort(diff)[:n]
+        n = min(n, n_samples)
+        indices = np.argpartition(diff, n - 1)[:n]
 
         return indices
     
 
     def Random_sampling(self, n):
         # Randomly select indices from unlabelled X
-        indices = np.random.choice(len(self.unlabelled_X_new), n, replace=False)
+        indices = self.rng.choice(len(self._get_split()['unlabelled_idx']), n, replace=False)
         return indices
 
 
@@ -215,26 +362,58 @@ class OCluDAL():
         """
         Function selects the n-highest entropy probabilities and returns the indices of them
         """
-        # Get the number of samples and classes
-        n_samples, n_classes = probalities.shape
+        # Calculate the entropy for each sample, treating 0 * log(0) as 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logp = np.log(probalities)
+        logp[~np.isfinite(logp)] = 0
+        entropy = -np.einsum('ij,ij->i', probalities, logp)
+
+        # Get the indices of the n samples with the highest entropy.
+        # With n == 0, argpartition(entropy, -0)[-0:] would return every index
+        n = min(n, len(entropy))
+        if n <= 0:
+            return np.array([], dtype=np.intp)
+        indices = np.argpartition(entropy, -n)[-n:]
 
-        # Calculate the entropy for each sample
-        entropy = -np.sum(probalities * np.log(probalities), axis=1)
+        return indices
 
-        entropy = []
-        for i in range(n_samples):
-            k_ = []
-            for k in range(n_classes):
-                k_.append(probalities[i][k] * np.log(probalities[i][k]))
-            entropy.append(-sum(k_))
-        
-        assert len(entropy) == n_samples
 
-        # Get the indices of the n samples with the highest entropy
-        indices = np.argsort(entropy)[-n:]
 
-        return indices
+    def _novelty_mask(self):
+        """
+        Fit an OCSVM on the labelled samples of each class and flag the unlabelled samples
+        that every OCSVM considers outliers.
 
+        Instead of calling predict on each OCSVM, the RBF decision functions of all of them
+        are evaluated together from the cached squared distances between the unlabelled
+        samples and the stacked support vectors.
+        """
+        split = self._get_split()
+        label_rows = [split['labelled_idx'][self.labelled_y_new == label] for label in self.unique_labels]
+
+        # One independent fit per label. libsvm releases the GIL so the fits can run on threads.
+        svms = joblib.Parallel(n_jobs=-1, prefer='threads')(
+            joblib.delayed(OneClassSVM().fit)(self._X[rows]) for rows in label_rows
+        )
+
+        # Stack support vectors of all OCSVMs, with a per-column gamma and a block diagonal
+        # matrix of dual coefficients so each column of decisions belongs to one OCSVM
+        sv_rows = np.concatenate([rows[svm.support_] for rows, svm in zip(label_rows, svms)])
+        gamma = np.concatenate([np.full(len(svm.support_), svm._gamma, dtype=np.float32) for svm in svms])
+        dual = np.zeros((len(sv_rows), len(svms)), dtype=np.float32)
+        start = 0
+        for k, svm in enumerate(svms):
+            end = start + len(svm.support_)
+            dual[start:end, k] = svm.dual_coef_.ravel()
+            start = end
+        intercepts = np.array([svm.intercept_[0] for svm in svms], dtype=np.float32)
+
+        # _S holds negative squared distances, so the RBF kernel is exp(gamma * S)
+        K = np.exp(gamma * self._similarity()[np.ix_(split['unlabelled_idx'], sv_rows)])
+        decisions = K @ dual + intercepts
+
+        # OneClassSVM.predict labels a sample as an outlier when its decision is not positive
+        return np.all(decisions <= 0, axis=1)
 
 
     def step1(self, max_iter=1, max_samples=800):
@@ -243,43 +422,45 @@ class OCluDAL():
         self.training_type = 'AP'
         # Start iterations
         iter_count = 0
-        while iter_count < max_iter and len(self.labelled_X_new) < max_samples:
+        while iter_count < max_iter and len(self._get_split()['labelled_idx']) < max_samples:
             iter_count += 1    
             print(f"Iteration {iter_count}")
                 
-            masks = []
-
             # Novelty detection using OCSVM
-            for label in self.unique_labels:
-                # Fit OCSVM
-                svm = OneClassSVM().fit(self.labelled_X_new[self.labelled_y_new == label])
-                novel_mask_i = svm.predict(self.unlabelled_X_new) == -1
-                
-                masks.append(novel_mask_i)
-
-            novel_mask = np.all(masks, axis=0)
-            novel_X = self.unlabelled_X_new[novel_mask]
-            print(f"Novelty detected: {len(novel_X)}")
+            novel_mask = self._novelty_mask()
+            novel_idx = np.flatnonzero(novel_mask)
+            print(f"Novelty detected: {len(novel_idx)}")
 
             # Clustering to select representative samples for annotation using Affinity Propagation
-            if len(novel_X) > 0:
-                ap = AffinityPropagation(damping=self.damping, preference=self.preference).fit(novel_X)
-                representative_X = ap.cluster_centers_
-                print(f"Representative samples chosen for annotation: {len(representative_X)}")
+            if len(novel_idx) > 0:
+                novel_rows = self._get_split()['unlabelled_idx'][novel_idx]
+                S_novel = self._similarity()[np.ix_(novel_rows, novel_rows)]
+                if self.preference is None:
+                    # Default to the median similarity and keep it for later iterations
+                    self.preference = float(np.median(S_novel))
+                # Approximate exemplars are enough here, so cap the message-passing sweeps.
+                # S_novel is a fresh slice of the cache, so AP may modify it in place
+                ap = AffinityPropagation(damping=self.damping, preference=self.preference,
+                                         max_iter=50, convergence_iter=5,
+                                         affinity='precomputed', copy=False).fit(S_novel)
+                print(f"Representative samples chosen for annotation: {len(ap.cluster_centers_indices_)}")
             else:
                 print("No novelty detected. Skipping clustering.")
                 break
 
-            # Find row indices of representative samples
-            representative_indices = []
-            for sample in representative_X:
-                representative_indices.append(np.where((self.unlabelled_X_new == sample).all(axis=1))[0][0])
+            # Map exemplar indices among the novel samples back to row indices of the unlabelled set
+            representative_indices = novel_idx[ap.cluster_centers_indices_].tolist()
 
             # Update labelled and unlabelled sets
             self.oracle_annotations(representative_indices)
 
             # Train model
             self.train_model()
+
+        # The similarity matrix is only used here; drop this object's reference to it
+        self._S = None
+
+        self.save_results()
             
 
 
@@ -290,19 +471,21 @@ class OCluDAL():
         """
         print("Starting uncertainty sampling and model training")
         iter = 0
-        num_samples = len(self.labelled_X_new)
+        num_samples = len(self._get_split()['labelled_idx'])
         self.training_type = 'BvSB'
 
         while iter <= max_iter and num_samples < max_samples:
-            print(f"Iteration {iter}  /{max_iter}     |Labelled data size: {len(self.labelled_X_new)}  |Unlabelled data size: {len(self.unlabelled_X_new)}", end='\r')
+            print(f"Iteration {iter}  /{max_iter}     |Labelled data size: {len(self._get_split()['labelled_idx'])}  |Unlabelled data size: {len(self._get_split()['unlabelled_idx'])}", end='\r')
             # Train SVM
-            clf = self.train_model()
-            
-            # Run classification on unlabelled data
-            self.run_classification(clf)
+            clf = self.train_model(classify=False)
 
             # Get probability estimates for unlabelled data
-            probalities = clf.predict_proba(self.unlabelled_X_new)
+            probalities = self._predict_proba(self._clf_input(labelled=False))
+
+            # Run classification on unlabelled data, reusing the probability estimates.
+            # Train accuracy is only evaluated periodically inside the loop
+            self.run_classification(clf, y_test_pred=clf.classes_[probalities.argmax(axis=1)],
+                                    with_train_accuracy=len(self._rows) % self.results_interval == 0)
 
             if sampling_type == 'BvSB':
                 # Find most useful samples to annotate
@@ -316,14 +499,13 @@ class OCluDAL():
             self.oracle_annotations(indices)
 
             # Update iteration count and number of samples
-            num_samples = len(self.labelled_X_new)
+            num_samples = len(self._get_split()['labelled_idx'])
             iter += 1
         
-        # Train final SVM
+        # Train final SVM and run classification on unlabelled data, always including train accuracy
         clf = self.train_model()
-        
-        # Run classification on unlabelled data
-        self.run_classification(clf)
+
+        self.save_results()
 
         return clf
     
@@ -346,7 +528,7 @@ class OCluDAL():
         return clf
     
 
-    def run_classification(self, clf):
+    def run_classification(self, clf, y_test_pred=None, with_train_accuracy=True):
         """
         Attempt to classify remaining data points.
 
@@ -354,6 +536,11 @@ class OCluDAL():
         ----------
         clf : sklearn classifier
             Trained classifier.
+        y_test_pred : array-like, optional
+            Predictions for the remaining data points, if already available.
+        with_train_accuracy : bool, default=True
+            Whether to also evaluate accuracy on the labelled data points. This needs a
+            second round of inference; when False it is recorded as NaN.
 
         Returns
         -------
@@ -364,69 +551,111 @@ class OCluDAL():
         num_annotations : int
             Number of annotations present at the point of classification.
         """
-        # Load final model and remaining data
-        X_test = self.unlabelled_X_new
-        X_train = self.labelled_X_new
-
         # Get predictions
-        try:
-            y_test_pred = clf.predict(X_test)
-            y_train_pred = clf.predict(X_train)
-        except:
-            y_test_pred = clf.predict_classes(X_test)
-            y_train_pred = clf.predict_classes(X_train)
+        predict = self._predict if clf is self.clf else clf.predict
+        if y_test_pred is None:
+            y_test_pred = predict(self._clf_input(labelled=False))
         
         # Get true labels
-        y_test_true = self.unlabelled_y_new
-        y_train_true = self.labelled_y_new
+        y_test_true = self.label_names[self.unlabelled_y_new]
 
         # Calculate f1 score
         f1 = f1_score(y_test_true, y_test_pred, average='weighted')
 
         # Calculate accuracy
         test_accuracy = accuracy_score(y_test_true, y_test_pred)
-        train_accuracy = accuracy_score(y_train_true, y_train_pred)
+        if with_train_accuracy:
+            y_train_pred = predict(self._clf_input(labelled=True))
+            train_accuracy = accuracy_score(self.label_names[self.labelled_y_new], y_train_pred)
+        else:
+            train_accuracy = np.nan
 
         classes = len(np.unique(self.labelled_y_new))
-        unique_classes = str(np.unique(self.labelled_y_new))
+        estimator = clf.estimator if isinstance(clf, CalibratedClassifierCV) else clf
 
-        # self.data = pd.DataFrame(columns=['model_type', 'accuracy', 'f1_score', 'Train Accuracy', 'Number of Annotations', 'damping', 'preference'])# Concat the results to data df
-        df = pd.DataFrame({
+        self._rows.append({
             'Accuracy': test_accuracy,
             'F1 Score': f1,
             'Train Accuracy': train_accuracy,
-            'Number of Annotations': len(self.labelled_X_new),
+            'Number of Annotations': len(self._get_split()['labelled_idx']),
             'damping': self.damping,
-            'preference': self.preference,
+            # Until AP has computed the median default, record that it is the one in use
+            'preference': self.preference if self.preference is not None else 'median',
             'Train_type': self.training_type,
             'Classes': classes,
-        }, index=[0])
+            'Estimator': type(estimator).__name__,
+        })
 
-        # Concat the results to data df
-        self.data = pd.concat([self.data, df], ignore_index=True)
+        # Periodically write the results to disk
+        if len(self._rows) % self.results_interval == 0:
+            self.save_results()
 
-        self.data.to_csv(f'Results\\{self.output_path}', index=False)
+        return f1, test_accuracy, len(self._get_split()['labelled_idx'])
 
-        return f1, test_accuracy, len(self.labelled_X_new)
+
+    @property
+    def data(self):
+        """
+        Classification results gathered so far.
+        """
+        return pd.DataFrame(self._rows, columns=self._columns)
+
+
+    def save_results(self):
+        """
+        Write the classification results gathered so far to the results csv.
+        """
+        self.data.to_csv(f'Results\\{self.output_path}', index=False, chunksize=10000)
 
 
     def save_clf(self, clf):
         """
         Save the classifier to a pickle file.
 
+        A precomputed-kernel SVM is saved as a PrecomputedRBFClassifier, which builds the
+        kernel against the training samples inside predict and predict_proba.
+
         Parameters
         ----------
         clf : sklearn classifier
             Trained classifier.
         """
         model_name = f'{self.output_path}'.split('.')[0]
+
+        if self._precomputed:
+            clf = PrecomputedRBFClassifier(clf, self.labelled_X_new, self._gamma)
+
         pickle.dump(clf, open(f"Models\\{self.output_path}", 'wb'))
     
     def copy(self):
         """
-        Copy the object.
+        Copy the object. The data set, scaled samples and similarity matrix are never
+        modified after preprocessing, so they are shared with the copy; only the
+        annotation state, results and classifier are duplicated.
+
+        The similarity matrix is built here if needed so that the copies share one matrix
+        instead of each building its own; step1 drops a copy's reference once it finishes.
         """
-        return copy.deepcopy(self)
+        if hasattr(self, '_S'):
+            self._similarity()
+
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new._rows = list(self._rows)
+        new.rng = copy.deepcopy(self.rng)
+
+        if hasattr(self, 'clf'):
+            # Unfitted copy of the classifier; it is retrained before every use
+            new.clf = clone(self.clf, safe=False)
+            new._resolve_predict()
+
+        if hasattr(self, '_labelled_mask'):
+            new._labelled_mask = self._labelled_mask.copy()
+            if self._precomputed:
+                new._sqdist = self._sqdist[:self._sqdist_size].copy()
+                new._sqdist_pos = self._sqdist_pos.copy()
+
+        return new
 
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.svm import OneClassSVM, SVC
+
+from OCluDAL import OCluDAL
+
+
+def make_csv(tmp_path):
+    """
+    Three classes: 'Standing' in rows 0-19, 'Walking' in rows 20-38 and 'Jumping' in row 39.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(40, 6)), columns=[f'f{i}' for i in range(6)])
+    df['Label'] = ['Standing'] * 20 + ['Walking'] * 19 + ['Jumping']
+    path = tmp_path / 'data.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.filterwarnings('error::FutureWarning')
+def test_svm_linear_trains_with_single_sample_class(tmp_path):
+    indices = [0, 1, 2, 20, 21, 39]
+    OC = OCluDAL(make_csv(tmp_path), annotations=len(indices), seed=0)
+    OC.initialise_data(model_type='SVM-linear', indices=indices, output_path='test.csv')
+    OC.preprocessing()
+
+    OC.train_model()
+
+    assert isinstance(OC.clf, CalibratedClassifierCV)
+    assert OC.data['Estimator'].tolist() == ['SVC']
+    probalities = OC._predict_proba(OC._clf_input(labelled=False))
+    assert probalities.shape == (40 - len(indices), 3)
+
+
+@pytest.mark.filterwarnings('error::FutureWarning')
+def test_svm_linear_calibration_folds_follow_smallest_class(tmp_path):
+    indices = [0, 1, 20, 21, 22]
+    OC = OCluDAL(make_csv(tmp_path), annotations=len(indices), seed=0)
+    OC.initialise_data(model_type='SVM-linear', indices=indices, output_path='test.csv')
+    OC.preprocessing()
+
+    OC.train_model()
+
+    assert isinstance(OC.clf, CalibratedClassifierCV)
+    assert OC.clf.cv == 2
+    assert OC.data['Estimator'].tolist() == ['LinearSVC']
+    probalities = OC._predict_proba(OC._clf_input(labelled=False))
+    assert probalities.shape == (40 - len(indices), 2)
+
+
+def test_entropy_sampling_selects_nothing_for_zero_samples():
+    probalities = np.array([[0.5, 0.5], [0.9, 0.1], [1.0, 0.0]])
+
+    assert len(OCluDAL.Entropy_Sampling(None, probalities, 0)) == 0
+    assert set(OCluDAL.Entropy_Sampling(None, probalities, 1)) == {0}
+
+
+def test_svm_rbf_precomputed_kernel_matches_rbf_svc(tmp_path, monkeypatch):
+    indices = [0, 1, 2, 3, 20, 21, 22, 23]
+    OC = OCluDAL(make_csv(tmp_path), annotations=len(indices), seed=0)
+    OC.initialise_data(model_type='SVM-rbf', indices=indices, output_path='test.csv')
+    OC.preprocessing()
+
+    clf = OC.train_model(classify=False)
+
+    rbf = SVC(kernel='rbf', C=1, gamma='scale').fit(OC.labelled_X_new, OC.label_names[OC.labelled_y_new])
+    expected = rbf.predict(OC.unlabelled_X_new)
+    np.testing.assert_array_equal(OC._predict(OC._clf_input(labelled=False)), expected)
+
+    # The saved model predicts from scaled features
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'Models').mkdir()
+    OC.save_clf(clf)
+    with open('Models\\test.csv', 'rb') as f:
+        saved = pickle.load(f)
+    np.testing.assert_array_equal(saved.predict(OC.unlabelled_X_new), expected)
+    assert saved.predict_proba(OC.unlabelled_X_new).shape == (40 - len(indices), 2)
+
+
+def test_novelty_mask_matches_per_label_one_class_svm(tmp_path):
+    indices = list(range(0, 15)) + list(range(20, 35))
+    OC = OCluDAL(make_csv(tmp_path), annotations=len(indices), seed=0)
+    OC.initialise_data(model_type='KNN5', indices=indices, output_path='test.csv')
+    OC.preprocessing()
+
+    outliers = [
+        OneClassSVM().fit(OC.labelled_X_new[OC.labelled_y_new == label]).predict(OC.unlabelled_X_new) == -1
+        for label in OC.unique_labels
+    ]
+    expected = np.all(outliers, axis=0)
+
+    assert 0 < expected.sum() < len(expected)
+    np.testing.assert_array_equal(OC._novelty_mask(), expected)
+
+
+def test_default_preference_is_recorded(tmp_path, monkeypatch):
+    indices = list(range(0, 15)) + list(range(20, 35))
+    OC = OCluDAL(make_csv(tmp_path), annotations=len(indices), seed=0)
+    OC.initialise_data(model_type='KNN5', indices=indices, output_path='test.csv')
+    OC.preprocessing()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'Results').mkdir()
+
+    OC.step1(max_iter=1)
+
+    preferences = OC.data['preference'].tolist()
+    assert preferences[0] == 'median'
+    assert preferences[-1] == OC.preference
+    assert not OC.data['preference'].isna().any()